@@ -6,42 +6,130 @@ Checks every 20 seconds and notifies when changes are detected
 """
 
 import time
+import random
+import hashlib
+import gzip
+from collections import defaultdict
+from dataclasses import dataclass, asdict
 from datetime import datetime
+from pathlib import Path
 from typing import Dict, List, Optional
 import sys
 import json
 import re
 import os
-import requests
 import argparse
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import atexit
+import queue
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+# requests, bs4, smtplib/email and selenium are imported where they are first
+# used, so --help and channels that are not configured don't pay for them
+
+# orjson is optional; fall back to the stdlib json module when it is missing
 try:
-    from selenium import webdriver
-    from selenium.webdriver.chrome.options import Options as ChromeOptions
-    from selenium.webdriver.common.by import By
-    SELENIUM_AVAILABLE = True
+    import orjson
 except ImportError:
-    SELENIUM_AVAILABLE = False
-    print("⚠️  Selenium not installed. Install with: pip install selenium")
+    orjson = None
+
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+
+# Unit data is server-rendered into the floor plan page as JSON script tags
+UNIT_DATA_SELECTOR = 'script[type="application/json"][data-jd-fp-selector="unit-data"]'
+
+# Notification payloads are serialized with json_dumps rather than requests' json=
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# PushPlus bodies carry the HTML unit table; gzip them once they are big enough to benefit
+GZIP_MIN_BYTES = 1024
+GZIP_JSON_HEADERS = {**JSON_HEADERS, 'Content-Encoding': 'gzip'}
+
+# Process umask, read once at import (reading it means briefly setting it, which
+# isn't safe once the writer thread is running)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+# Resources the browser fallback never needs to load
+BLOCKED_URL_PATTERNS = ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.webp', '*.woff*',
+                        '*analytics*', '*googletagmanager*', '*facebook*', '*doubleclick*']
+
+
+def json_dumps(obj, indent: bool = False) -> bytes:
+    """Serialize obj to UTF-8 JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode('utf-8')
+
+
+def json_loads(data):
+    """Parse JSON from str or bytes, using orjson when available"""
+    if orjson is not None:
+        # orjson only takes exact str/bytes types, not subclasses such as bs4's strings
+        if isinstance(data, str) and type(data) is not str:
+            data = str(data)
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# Parsed email configs keyed by path, as (st_mtime_ns, config)
+_EMAIL_CFG_CACHE = {}
+
+
+def _load_email_config(path: str) -> dict:
+    """
+    Load an email config JSON file, reusing the parsed result until the file changes
+    
+    Raises FileNotFoundError when the file is missing, so callers need no separate exists check.
+    """
+    with open(path, 'rb') as f:
+        mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+        cached = _EMAIL_CFG_CACHE.get(path)
+        if cached and cached[0] == mtime_ns:
+            return cached[1]
+        config = json_loads(f.read())
+    
+    _EMAIL_CFG_CACHE[path] = (mtime_ns, config)
+    return config
+
+
+@dataclass
+class Unit:
+    """An available apartment unit"""
+    __slots__ = ('unit', 'floor_plan', 'last_seen')
+    
+    unit: str
+    floor_plan: str
+    last_seen: str
 
 
 class ApartmentMonitor:
+    # Static wrapper for email notifications; only the title and body vary
+    _EMAIL_TEMPLATE = (
+        '<html><head></head><body>'
+        '<div style="font-family: Arial, sans-serif; padding: 20px;">'
+        '<h2 style="color: #2c3e50;">{title}</h2>'
+        '<div style="margin-top: 20px;">{body}</div>'
+        '</div></body></html>'
+    )
+    
     def __init__(self, url: str, check_interval: int = 20, headless: bool = True, 
                  wechat_token: Optional[str] = None, wechat_method: str = 'pushplus',
                  notify_floor_plans: Optional[List[str]] = None,
                  email_to: Optional[List[str]] = None, email_from: Optional[str] = None,
                  smtp_server: Optional[str] = None, smtp_port: int = 587,
-                 smtp_password: Optional[str] = None):
+                 smtp_password: Optional[str] = None, smtp_servers: Optional[List[dict]] = None,
+                 use_browser: bool = False,
+                 notify_window: int = 0, notify_max_batch: int = 10):
         """
         Initialize the apartment monitor
         
         Args:
             url: The URL to monitor
             check_interval: Time in seconds between checks
-            headless: Whether to run browser in headless mode
+            headless: Whether to run browser in headless mode (only with use_browser)
             wechat_token: Token for WeChat notifications (optional)
             wechat_method: Method for WeChat notifications ('pushplus', 'serverchan', or 'work')
             notify_floor_plans: List of floor plans to notify about (e.g. ['N', 'O', 'P']). 
@@ -51,35 +139,97 @@ class ApartmentMonitor:
             smtp_server: SMTP server address
             smtp_port: SMTP server port
             smtp_password: SMTP password
+            smtp_servers: SMTP endpoints to spread email over, each a dict with host, port,
+                          user, password, rate (messages/sec) and workers. Overrides smtp_server.
+            use_browser: Render pages with Selenium instead of plain HTTP requests
+            notify_window: Seconds to collect changes into one notification (0 = send immediately)
+            notify_max_batch: Send early once this many changes are pending
         """
         self.url = url
         self.check_interval = check_interval
+        
+        # Poll interval backs off while nothing changes and resets on the next change
+        self._base_interval = check_interval
+        self._cur_interval = check_interval
+        self._max_interval = 5 * check_interval
         self.headless = headless
         self.previous_units = {}
         self.wechat_token = wechat_token
         self.wechat_method = wechat_method
-        self.notify_floor_plans = [p.upper() for p in notify_floor_plans] if notify_floor_plans else None
+        # Cleared if PushPlus turns out not to accept gzip request bodies
+        self._pushplus_gzip = True
+        # frozenset: checked once per unit when filtering
+        self.notify_floor_plans = frozenset(p.upper() for p in notify_floor_plans) if notify_floor_plans else None
         
-        # Handle email_to as either string or list
-        if isinstance(email_to, str):
-            self.email_to = [email_to]
-        elif isinstance(email_to, list):
-            self.email_to = email_to
+        # Accept email_to as either string or list; settled once here so the send path
+        # never has to check it again
+        if isinstance(email_to, (list, tuple)):
+            self.email_recipients = tuple(email_to)
         else:
-            self.email_to = None
+            self.email_recipients = (email_to,) if email_to else ()
             
         self.email_from = email_from
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
         self.smtp_password = smtp_password
+        if smtp_servers is None and smtp_server and smtp_password:
+            smtp_servers = [{'host': smtp_server, 'port': smtp_port, 'password': smtp_password}]
+        self.smtp_servers = smtp_servers or []
+        self.email_enabled = bool(self.email_recipients and email_from and self.smtp_servers)
+        self._mailer = None
+        
+        # Changes waiting to be sent, keyed by unit number so repeats collapse
+        self.notify_window = notify_window
+        self.notify_max_batch = notify_max_batch
+        self._pending = {'new': {}, 'removed': {}}
+        self._pending_since = None
+        self.use_browser = use_browser
         self.driver = None
+        self._current_groups = {}
+        # Units from the most recent check, for flushing pending changes at shutdown
+        self._latest_units = {}
+        
+        # File writes happen on a background thread so disk latency stays off the poll loop
+        self._write_q = queue.Queue(maxsize=4)
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer.start()
+        self._last_units_hash = None
+        
+        # Shared HTTP session, created on first use (see the _http property)
+        self._http_session = None
+        
+        # Per-URL (ETag, Last-Modified, units) from the last full response, for conditional GETs
+        self._page_cache = {}
+        # Units from each plan's last successful check, reused when a fetch fails
+        self._plan_units = {}
         self.floor_plans = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm', 
                            'n', 'o', 'p', 'q', 'r', 's', 't', 'u', 'v']
         
+    @property
+    def _http(self) -> 'requests.Session':
+        """Shared HTTP session so page fetches and notifications reuse keep-alive connections"""
+        if self._http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            
+            self._http_session = requests.Session()
+            # Retry connection failures briefly; POSTs aren't retried after being sent
+            retries = Retry(total=2, backoff_factor=0.3)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retries)
+            self._http_session.mount('https://', adapter)
+            self._http_session.mount('http://', adapter)
+            atexit.register(self._http_session.close)
+        return self._http_session
+    
     def setup_driver(self):
         """Setup Selenium WebDriver"""
-        if not SELENIUM_AVAILABLE:
+        try:
+            from selenium import webdriver
+            from selenium.webdriver.chrome.options import Options as ChromeOptions
+        except ImportError:
             print("❌ Cannot initialize driver: Selenium is not installed")
+            print("Install with: pip install selenium")
             return False
         
         try:
@@ -90,14 +240,68 @@ class ApartmentMonitor:
             options.add_argument('--disable-dev-shm-usage')
             options.add_argument('--disable-gpu')
             options.add_argument('--window-size=1920,1080')
-            options.add_argument('--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+            options.add_argument(f'--user-agent={USER_AGENT}')
+            options.add_argument('--blink-settings=imagesEnabled=false')
+            options.add_argument('--disable-extensions')
+            # Unit data is in the DOM once it is parsed; don't wait for images/analytics
+            options.page_load_strategy = 'eager'
             
             self.driver = webdriver.Chrome(options=options)
+            
+            try:
+                self.driver.execute_cdp_cmd('Network.enable', {})
+                self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+            except Exception as e:
+                print(f"⚠️  Could not block static resources: {e}")
+            
             return True
         except Exception as e:
             print(f"❌ Error setting up Chrome driver: {e}")
             return False
     
+    def _parse_unit_data(self, json_texts: List[str]) -> List[str]:
+        """
+        Extract unit numbers from the floor plan's embedded unit-data JSON
+        
+        Args:
+            json_texts: Text content of each unit-data script tag
+            
+        Returns:
+            Sorted list of available unit numbers
+            
+        Raises:
+            ValueError: If the page has unit-data scripts but none of them parse
+        """
+        units = set()
+        parsed = 0
+        error = None
+        for json_text in json_texts:
+            try:
+                if json_text:
+                    data = json_loads(json_text)
+                    parsed += 1
+                    
+                    # Extract the unit number
+                    # It can be in 'apartment_number' or 'title' field
+                    unit_num = data.get('apartment_number') or data.get('title', '')
+                    
+                    # Format as #XXX if it's not already
+                    if unit_num and not unit_num.startswith('#'):
+                        unit_num = f"#{unit_num}"
+                    
+                    if unit_num:
+                        units.add(unit_num)
+                        
+            except (ValueError, TypeError, AttributeError) as e:
+                error = e
+                continue
+        
+        # A page whose unit data can't be read is a failed check, not an empty floor plan
+        if error is not None and not parsed:
+            raise ValueError(f"could not parse unit data: {error}")
+        
+        return sorted(units)
+    
     def check_floor_plan(self, plan_name: str) -> List[str]:
         """
         Check a specific floor plan for available units by parsing embedded JSON data
@@ -107,130 +311,165 @@ class ApartmentMonitor:
             
         Returns:
             List of available unit numbers
-        """
-        try:
-            # Navigate to the floor plan page with # to trigger availability display
-            url = f"https://hanoverwinchester.com/floorplans/{plan_name.lower()}/#"
-            self.driver.get(url)
-            time.sleep(3)  # Wait for page and JavaScript to load
-            
-            # Find all script tags with unit data
-            unit_scripts = self.driver.find_elements(
-                By.CSS_SELECTOR, 
-                'script[type="application/json"][data-jd-fp-selector="unit-data"]'
-            )
             
-            units = []
-            for script in unit_scripts:
-                try:
-                    # Parse the JSON data
-                    json_text = script.get_attribute('textContent')
-                    if json_text:
-                        data = json.loads(json_text)
-                        
-                        # Extract the unit number
-                        # It can be in 'apartment_number' or 'title' field
-                        unit_num = data.get('apartment_number') or data.get('title', '')
-                        
-                        # Format as #XXX if it's not already
-                        if unit_num and not unit_num.startswith('#'):
-                            unit_num = f"#{unit_num}"
-                        
-                        if unit_num and unit_num not in units:
-                            units.append(unit_num)
-                            
-                except (json.JSONDecodeError, KeyError) as e:
-                    continue
-            
-            return sorted(units)
-            
-        except Exception as e:
-            return []
+        Raises:
+            Any request or HTTP error, so a failed fetch isn't mistaken for "no units"
+        """
+        if self.use_browser:
+            return self._check_floor_plan_browser(plan_name)
+        
+        from bs4 import BeautifulSoup
+        
+        url = f"https://hanoverwinchester.com/floorplans/{plan_name.lower()}/"
+        headers = {'User-Agent': USER_AGENT}
+        
+        # Ask the server to skip the body if the page hasn't changed since last time
+        cached = self._page_cache.get(url)
+        if cached:
+            etag, last_modified, units = cached
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        
+        response = self._http.get(url, headers=headers, timeout=15)
+        if response.status_code == 304 and cached:
+            return units
+        response.raise_for_status()
+        
+        soup = BeautifulSoup(response.text, 'html.parser')
+        unit_scripts = soup.select(UNIT_DATA_SELECTOR)
+        units = self._parse_unit_data([script.get_text() for script in unit_scripts])
+        
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self._page_cache[url] = (etag, last_modified, units)
+        else:
+            self._page_cache.pop(url, None)
+        
+        return units
     
-    def fetch_available_units(self) -> Dict[str, dict]:
+    def _check_floor_plan_browser(self, plan_name: str) -> List[str]:
+        """Check a specific floor plan by rendering it in the Selenium browser"""
+        # Navigate to the floor plan page with # to trigger availability display
+        url = f"https://hanoverwinchester.com/floorplans/{plan_name.lower()}/#"
+        self.driver.get(url)
+        time.sleep(3)  # Wait for page and JavaScript to load
+        
+        # Read every unit-data script in one WebDriver call instead of one per element
+        json_texts = self.driver.execute_script(
+            "return Array.from(document.querySelectorAll(arguments[0]), el => el.textContent);",
+            UNIT_DATA_SELECTOR
+        )
+        return self._parse_unit_data(json_texts or [])
+    
+    def fetch_available_units(self) -> Dict[str, Unit]:
         """
         Fetch all available units across all floor plans
         
         Returns:
             Dictionary mapping unit numbers to their details
         """
-        if not self.driver:
+        if self.use_browser and not self.driver:
             if not self.setup_driver():
                 return {}
         
         all_units = {}
         
-        for plan_name in self.floor_plans:
+        # One timestamp for the whole check rather than one per unit
+        now_iso = datetime.now().isoformat()
+        total = len(self.floor_plans)
+        
+        for idx, plan_name in enumerate(self.floor_plans, 1):
             try:
-                idx = self.floor_plans.index(plan_name) + 1
-                total = len(self.floor_plans)
-                print(f"   [{idx}/{total}] Checking {plan_name.upper()}... ", end='', flush=True)
+                plan = plan_name.upper()
+                print(f"   [{idx}/{total}] Checking {plan}... ", end='', flush=True)
                 
                 units = self.check_floor_plan(plan_name)
                 
+                plan_units = {unit_num: Unit(unit_num, plan, now_iso) for unit_num in units}
+                self._plan_units[plan] = plan_units
+                all_units.update(plan_units)
+                
                 if units:
                     print(f"✓ {len(units)} units: {', '.join(units)}")
-                    for unit_num in units:
-                        all_units[unit_num] = {
-                            'unit': unit_num,
-                            'floor_plan': plan_name.upper(),
-                            'last_seen': datetime.now().isoformat()
-                        }
                 else:
                     print("No units")
                     
             except Exception as e:
-                print(f"Error: {e}")
+                # Keep what we last saw for this plan; reporting it empty would send
+                # a GONE notification now and a NEW one when the page recovers
+                known = self._plan_units.get(plan)
+                if known is None:
+                    known = {num: u for num, u in self.previous_units.items() if u.floor_plan == plan}
+                all_units.update(known)
+                print(f"Error: {e} (keeping {len(known)} last known units)")
                 continue
         
         return all_units
     
-    def compare_units(self, current: Dict[str, dict], previous: Dict[str, dict]) -> Dict[str, List]:
-        """Compare current and previous unit data"""
-        changes = {
-            'new': [],
-            'removed': []
-        }
-        
-        current_units = set(current.keys())
-        previous_units = set(previous.keys())
+    def _next_interval(self, changed: bool) -> float:
+        """
+        Update the backoff state and return how long to sleep before the next check
         
-        # Find newly available units
-        new_units = current_units - previous_units
-        changes['new'] = [current[unit] for unit in sorted(new_units)]
+        Args:
+            changed: Whether the last check saw a change in available units
+            
+        Returns:
+            Seconds to sleep, including a small random jitter
+        """
+        if changed:
+            self._cur_interval = self._base_interval
+        else:
+            self._cur_interval = min(self._max_interval, self._cur_interval * 1.5)
         
-        # Find units no longer available
-        removed_units = previous_units - current_units
-        changes['removed'] = [previous[unit] for unit in sorted(removed_units)]
+        return self._cur_interval + random.uniform(0, 0.1 * self._cur_interval)
+    
+    def _units_digest(self, units: Dict[str, Unit]) -> bytes:
+        """Fingerprint the set of (unit, floor plan) pairs, ignoring last_seen"""
+        digest = hashlib.blake2b(digest_size=8)
+        for unit_num in sorted(units):
+            digest.update(f"{unit_num}|{units[unit_num].floor_plan}\n".encode('utf-8'))
+        return digest.digest()
+    
+    def compare_units(self, current: Dict[str, Unit], previous: Dict[str, Unit]) -> Dict[str, List]:
+        """Compare current and previous unit data"""
+        # dict key views support set operations directly, no need to copy into sets
+        return {
+            'new': [current[unit] for unit in sorted(current.keys() - previous.keys())],
+            'removed': [previous[unit] for unit in sorted(previous.keys() - current.keys())]
+        }
+    
+    def _group_by_plan(self, units: Dict[str, Unit]) -> Dict[str, List[str]]:
+        """Group unit numbers by floor plan, with plans and unit numbers sorted"""
+        by_plan = defaultdict(list)
+        for unit_num, info in units.items():
+            by_plan[info.floor_plan].append(unit_num)
         
-        return changes
+        return {plan: sorted(by_plan[plan]) for plan in sorted(by_plan)}
     
-    def print_units(self, units: Dict[str, dict]):
+    def print_units(self, units: Dict[str, Unit], groups: Optional[Dict[str, List[str]]] = None):
         """Print unit information in a readable format"""
-        print("\n" + "="*80)
-        print(f"📊 Available Units ({len(units)} total)")
-        print("="*80)
+        # Build the whole report and write it in one go rather than a print() per line
+        out = ["", "="*80, f"📊 Available Units ({len(units)} total)", "="*80]
         
         if not units:
-            print("⚠️  No units currently available.")
-            return
+            out.append("⚠️  No units currently available.")
+        else:
+            if groups is None:
+                groups = self._group_by_plan(units)
+            
+            # Print grouped by floor plan
+            for plan, unit_list in groups.items():
+                out.append(f"\n🏠 Floor Plan {plan} ({len(unit_list)} units):")
+                # Print units in rows of 8
+                for i in range(0, len(unit_list), 8):
+                    row = unit_list[i:i+8]
+                    out.append(f"   {', '.join(row)}")
         
-        # Group by floor plan
-        by_plan = {}
-        for unit_num, info in units.items():
-            plan = info['floor_plan']
-            if plan not in by_plan:
-                by_plan[plan] = []
-            by_plan[plan].append(unit_num)
-        
-        # Print grouped by floor plan
-        for plan in sorted(by_plan.keys()):
-            unit_list = sorted(by_plan[plan])
-            print(f"\n🏠 Floor Plan {plan} ({len(unit_list)} units):")
-            # Print units in rows of 8
-            for i in range(0, len(unit_list), 8):
-                row = unit_list[i:i+8]
-                print(f"   {', '.join(row)}")
+        sys.stdout.write("\n".join(out) + "\n")
+        sys.stdout.flush()
     
     def print_changes(self, changes: Dict[str, List]):
         """Print changes in a readable format"""
@@ -239,87 +478,117 @@ class ApartmentMonitor:
         if not has_changes:
             return
         
-        print("\n" + "🔔 " + "="*78)
-        print("  CHANGES DETECTED!")
-        print("="*80)
+        out = ["", "🔔 " + "="*78, "  CHANGES DETECTED!", "="*80]
         
         if changes['new']:
-            print(f"\n✨ NEW UNITS AVAILABLE ({len(changes['new'])}):")
-            # Group by floor plan
-            by_plan = {}
-            for unit in changes['new']:
-                plan = unit['floor_plan']
-                if plan not in by_plan:
-                    by_plan[plan] = []
-                by_plan[plan].append(unit['unit'])
-            
-            for plan in sorted(by_plan.keys()):
-                units = sorted(by_plan[plan])
-                print(f"   Floor Plan {plan}: {', '.join(units)}")
+            out.append(f"\n✨ NEW UNITS AVAILABLE ({len(changes['new'])}):")
+            groups = self._group_by_plan({u.unit: u for u in changes['new']})
+            for plan, units in groups.items():
+                out.append(f"   Floor Plan {plan}: {', '.join(units)}")
         
         if changes['removed']:
-            print(f"\n❌ UNITS NO LONGER AVAILABLE ({len(changes['removed'])}):")
-            # Group by floor plan
-            by_plan = {}
-            for unit in changes['removed']:
-                plan = unit['floor_plan']
-                if plan not in by_plan:
-                    by_plan[plan] = []
-                by_plan[plan].append(unit['unit'])
-            
-            for plan in sorted(by_plan.keys()):
-                units = sorted(by_plan[plan])
-                print(f"   Floor Plan {plan}: {', '.join(units)}")
+            out.append(f"\n❌ UNITS NO LONGER AVAILABLE ({len(changes['removed'])}):")
+            groups = self._group_by_plan({u.unit: u for u in changes['removed']})
+            for plan, units in groups.items():
+                out.append(f"   Floor Plan {plan}: {', '.join(units)}")
+        
+        out.append("\n" + "="*80)
         
-        print("\n" + "="*80)
+        sys.stdout.write("\n".join(out) + "\n")
+        sys.stdout.flush()
+    
+    def save_to_file(self, units: Dict[str, Unit], filename: str = "available_apartments.txt",
+                     groups: Optional[Dict[str, List[str]]] = None):
+        """Queue available apartments to be saved to a text file by the writer thread"""
+        item = (units, filename, groups, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        try:
+            self._write_q.put_nowait(item)
+        except queue.Full:
+            # Only the newest snapshot matters; drop the oldest pending one
+            try:
+                self._write_q.get_nowait()
+                self._write_q.task_done()
+            except queue.Empty:
+                pass
+            self._write_q.put_nowait(item)
+    
+    def _writer_loop(self):
+        """Write queued snapshots to disk until a None sentinel is received"""
+        while True:
+            item = self._write_q.get()
+            try:
+                if item is None:
+                    return
+                self._write_files(*item)
+            finally:
+                self._write_q.task_done()
     
-    def save_to_file(self, units: Dict[str, dict], filename: str = "available_apartments.txt"):
-        """Save available apartments to a text file"""
+    def _write_files(self, units: Dict[str, Unit], filename: str,
+                     groups: Optional[Dict[str, List[str]]], updated_at: str):
+        """Write the text and JSON snapshots (runs on the writer thread)"""
         try:
             # Save human-readable text file
-            with open(filename, 'w') as f:
-                f.write("="*80 + "\n")
-                f.write("AVAILABLE APARTMENTS\n")
-                f.write(f"Last Updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Total Units: {len(units)}\n")
-                f.write("="*80 + "\n\n")
+            lines = [
+                "="*80,
+                "AVAILABLE APARTMENTS",
+                f"Last Updated: {updated_at}",
+                f"Total Units: {len(units)}",
+                "="*80,
+                "",
+            ]
+            
+            if not units:
+                lines.append("No units currently available.")
+            else:
+                if groups is None:
+                    groups = self._group_by_plan(units)
                 
-                if not units:
-                    f.write("No units currently available.\n")
-                else:
-                    # Group by floor plan
-                    by_plan = {}
-                    for unit_num, info in units.items():
-                        plan = info['floor_plan']
-                        if plan not in by_plan:
-                            by_plan[plan] = []
-                        by_plan[plan].append(unit_num)
-                    
-                    # Write grouped by floor plan
-                    for plan in sorted(by_plan.keys()):
-                        unit_list = sorted(by_plan[plan])
-                        f.write(f"Floor Plan {plan} ({len(unit_list)} units):\n")
-                        for unit in unit_list:
-                            f.write(f"  {unit}\n")
-                        f.write("\n")
+                # Write grouped by floor plan
+                for plan, unit_list in groups.items():
+                    lines.append(f"Floor Plan {plan} ({len(unit_list)} units):")
+                    lines.extend(f"  {unit}" for unit in unit_list)
+                    lines.append("")
+            
+            self._atomic_write(filename, ("\n".join(lines) + "\n").encode('utf-8'))
             
             # Also save JSON for easy loading
             json_filename = filename.replace('.txt', '.json')
-            with open(json_filename, 'w') as f:
-                json.dump(units, f, indent=2)
+            data = {unit_num: asdict(unit) for unit_num, unit in units.items()}
+            self._atomic_write(json_filename, json_dumps(data, indent=True))
                 
         except Exception as e:
             print(f"⚠️  Warning: Could not save to file: {e}")
     
-    def load_from_file(self, filename: str = "available_apartments.json") -> Dict[str, dict]:
+    def _atomic_write(self, filename: str, data: bytes):
+        """Write data to a temp file next to filename, then rename it into place"""
+        directory = os.path.dirname(os.path.abspath(filename))
+        with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False) as f:
+            f.write(data)
+        try:
+            # Temp files are created 0600; give the result the mode a plain open() would
+            try:
+                mode = os.stat(filename).st_mode & 0o7777
+            except FileNotFoundError:
+                mode = 0o666 & ~_UMASK
+            os.chmod(f.name, mode)
+            os.replace(f.name, filename)
+        except OSError:
+            os.unlink(f.name)
+            raise
+    
+    def load_from_file(self, filename: str = "available_apartments.json") -> Dict[str, Unit]:
         """Load previous apartments from JSON file"""
         try:
             if not os.path.exists(filename):
                 return {}
             
-            with open(filename, 'r') as f:
-                units = json.load(f)
-                return units
+            with open(filename, 'rb') as f:
+                data = json_loads(f.read())
+            
+            return {
+                unit_num: Unit(info['unit'], info['floor_plan'], info.get('last_seen', ''))
+                for unit_num, info in data.items()
+            }
         except Exception as e:
             print(f"⚠️  Warning: Could not load from file: {e}")
             return {}
@@ -361,9 +630,39 @@ class ApartmentMonitor:
             'content': content,
             'template': 'html'
         }
-        response = requests.post(url, json=data, timeout=10)
-        result = response.json()
-        return result.get('code') == 200
+        body = json_dumps(data)
+        
+        if self._pushplus_gzip and len(body) >= GZIP_MIN_BYTES:
+            response = self._http.post(url, data=gzip.compress(body), headers=GZIP_JSON_HEADERS, timeout=10)
+            # Only resend when the encoding itself was refused; any other failure may
+            # mean the message already went out, or that retrying would hit a rate limit
+            if not self._gzip_rejected(response):
+                return self._pushplus_ok(response)
+            print(f"ℹ️  PushPlus rejected a gzip body (HTTP {response.status_code}), sending uncompressed from now on")
+            self._pushplus_gzip = False
+        
+        response = self._http.post(url, data=body, headers=JSON_HEADERS, timeout=10)
+        return self._pushplus_ok(response)
+    
+    @staticmethod
+    def _pushplus_reply(response) -> Optional[dict]:
+        """Parse a PushPlus JSON reply, or None if the body isn't a JSON object"""
+        try:
+            result = json_loads(response.content)
+        except ValueError:
+            return None
+        return result if isinstance(result, dict) else None
+    
+    def _gzip_rejected(self, response) -> bool:
+        """Whether a failed response points at the gzip request body rather than anything else"""
+        if response.status_code in (400, 415):
+            return True
+        return not response.ok and self._pushplus_reply(response) is None
+    
+    def _pushplus_ok(self, response) -> bool:
+        """Whether PushPlus accepted the message"""
+        result = self._pushplus_reply(response)
+        return result is not None and result.get('code') == 200
     
     def _send_serverchan(self, title: str, content: str) -> bool:
         """Send notification via Server酱 (ServerChan)"""
@@ -372,8 +671,8 @@ class ApartmentMonitor:
             'title': title,
             'desp': content
         }
-        response = requests.post(url, data=data, timeout=10)
-        result = response.json()
+        response = self._http.post(url, data=data, timeout=10)
+        result = json_loads(response.content)
         return result.get('code') == 0
     
     def _send_wechat_work(self, title: str, content: str) -> bool:
@@ -385,8 +684,8 @@ class ApartmentMonitor:
                 'content': f'{title}\n\n{content}'
             }
         }
-        response = requests.post(url, json=data, timeout=10)
-        result = response.json()
+        response = self._http.post(url, data=json_dumps(data), headers=JSON_HEADERS, timeout=10)
+        result = json_loads(response.content)
         return result.get('errcode') == 0
     
     def filter_changes_by_floor_plan(self, changes: Dict[str, List]) -> Dict[str, List]:
@@ -395,17 +694,24 @@ class ApartmentMonitor:
             return changes
         
         filtered = {
-            'new': [u for u in changes['new'] if u['floor_plan'] in self.notify_floor_plans],
-            'removed': [u for u in changes['removed'] if u['floor_plan'] in self.notify_floor_plans]
+            'new': [u for u in changes['new'] if u.floor_plan in self.notify_floor_plans],
+            'removed': [u for u in changes['removed'] if u.floor_plan in self.notify_floor_plans]
         }
         return filtered
     
-    def filter_units_by_floor_plan(self, units: Dict[str, dict]) -> Dict[str, dict]:
+    def filter_units_by_floor_plan(self, units: Dict[str, Unit]) -> Dict[str, Unit]:
         """Filter units to only include specified floor plans"""
         if not self.notify_floor_plans:
             return units
         
-        return {k: v for k, v in units.items() if v['floor_plan'] in self.notify_floor_plans}
+        return {k: v for k, v in units.items() if v.floor_plan in self.notify_floor_plans}
+    
+    def filter_groups_by_floor_plan(self, groups: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """Filter floor plan groups to only include specified floor plans"""
+        if not self.notify_floor_plans:
+            return groups
+        
+        return {plan: units for plan, units in groups.items() if plan in self.notify_floor_plans}
     
     def send_email_notification(self, title: str, content: str) -> bool:
         """
@@ -416,65 +722,120 @@ class ApartmentMonitor:
             content: Email content (HTML)
             
         Returns:
-            True if email sent successfully, False otherwise
+            True if email was queued for sending, False otherwise
         """
-        if not all([self.email_to, self.email_from, self.smtp_server, self.smtp_password]):
+        if not self.email_enabled:
             return False
         
         try:
-            # Convert <br> to <br/> for proper HTML
-            html_content = content.replace('<br>', '<br/>')
-            
-            # Create HTML email
-            html_body = f"""
-            <html>
-              <head></head>
-              <body>
-                <div style="font-family: Arial, sans-serif; padding: 20px;">
-                  <h2 style="color: #2c3e50;">{title}</h2>
-                  <div style="margin-top: 20px;">
-                    {html_content}
-                  </div>
-                </div>
-              </body>
-            </html>
-            """
-            
-            # Send to each recipient
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.email_from, self.smtp_password)
-                
-                for recipient in self.email_to:
-                    msg = MIMEMultipart('alternative')
-                    msg['Subject'] = title
-                    msg['From'] = self.email_from
-                    msg['To'] = recipient
-                    
-                    html_part = MIMEText(html_body, 'html')
-                    msg.attach(html_part)
-                    
-                    server.send_message(msg)
-            
-            return True
+            # Only the template fill happens here; MIME encoding and delivery run on
+            # the mail workers, so a slow provider doesn't block the check loop
+            html_body = self._EMAIL_TEMPLATE.format(title=title, body=content)
+            return self._get_mailer().submit(title, html_body, self.email_recipients)
         except Exception as e:
             print(f"⚠️  Failed to send email: {e}")
             return False
     
-    def format_notification(self, changes: Dict[str, List], current_units: Dict[str, dict]) -> tuple:
+    def _get_mailer(self) -> 'MailDispatcher':
+        """Start the SMTP worker pools on first use"""
+        if self._mailer is None:
+            from mailer import MailDispatcher, SMTPEndpoint
+            
+            endpoints = [SMTPEndpoint.from_config(cfg) for cfg in self.smtp_servers]
+            self._mailer = MailDispatcher(endpoints, self.email_from)
+        return self._mailer
+    
+    def send_notifications(self, title: str, content: str) -> List[str]:
+        """
+        Send WeChat and email notifications concurrently
+        
+        Args:
+            title: Notification title
+            content: Notification content (HTML)
+            
+        Returns:
+            Names of the channels that sent successfully. Email is only queued here and
+            delivered by the mail workers, so it is reported as "Email (queued)".
+        """
+        channels = [
+            ("WeChat", self.send_wechat_notification),
+            ("Email (queued)", self.send_email_notification),
+        ]
+        
+        # Both senders block on network I/O, so overlap them instead of waiting on each in turn
+        with ThreadPoolExecutor(max_workers=len(channels)) as pool:
+            futures = [(name, pool.submit(send, title, content)) for name, send in channels]
+            return [name for name, future in futures if future.result()]
+    
+    def queue_changes(self, changes: Dict[str, List]):
+        """Merge changes into the pending notification batch"""
+        for unit in changes['new']:
+            # A unit that was removed and came back within the window is no change at all
+            if self._pending['removed'].pop(unit.unit, None) is None:
+                self._pending['new'][unit.unit] = unit
+        
+        for unit in changes['removed']:
+            if self._pending['new'].pop(unit.unit, None) is None:
+                self._pending['removed'][unit.unit] = unit
+        
+        if not any(self._pending.values()):
+            self._pending_since = None
+        elif self._pending_since is None:
+            self._pending_since = time.monotonic()
+    
+    def flush_pending_notifications(self, current_units: Optional[Dict[str, Unit]] = None,
+                                    force: bool = False):
+        """
+        Send the pending batch once its window has elapsed or it is large enough
+        
+        Args:
+            current_units: Units from the latest check (defaults to the last one seen)
+            force: Send whatever is pending regardless of the window
+        """
+        pending_count = len(self._pending['new']) + len(self._pending['removed'])
+        if not pending_count:
+            return
+        
+        window_elapsed = time.monotonic() - self._pending_since >= self.notify_window
+        if not force and not window_elapsed and pending_count < self.notify_max_batch:
+            return
+        
+        if current_units is None:
+            current_units = self._latest_units
+        
+        changes = {
+            kind: [units[unit_num] for unit_num in sorted(units)]
+            for kind, units in self._pending.items()
+        }
+        self._pending = {'new': {}, 'removed': {}}
+        self._pending_since = None
+        
+        notify_units = self.filter_units_by_floor_plan(current_units)
+        notify_groups = self.filter_groups_by_floor_plan(self._current_groups)
+        title, content = self.format_notification(changes, notify_units, groups=notify_groups)
+        
+        notifications_sent = self.send_notifications(title, content)
+        
+        if notifications_sent:
+            print(f"📱 Notifications sent: {', '.join(notifications_sent)} ({pending_count} changes)")
+        else:
+            print("⚠️  No notifications configured or all failed")
+    
+    def format_notification(self, changes: Dict[str, List], current_units: Dict[str, Unit],
+                            groups: Optional[Dict[str, List[str]]] = None) -> tuple:
         """Format notification title and content with apartment numbers in title"""
         # Build title with specific apartment numbers
         title_parts = []
         
         if changes['new']:
-            new_units = [u['unit'] for u in changes['new']]
+            new_units = [u.unit for u in changes['new']]
             if len(new_units) <= 3:
                 title_parts.append(f"✨ NEW: {', '.join(new_units)}")
             else:
                 title_parts.append(f"✨ NEW: {', '.join(new_units[:3])} +{len(new_units)-3} more")
         
         if changes['removed']:
-            removed_units = [u['unit'] for u in changes['removed']]
+            removed_units = [u.unit for u in changes['removed']]
             if len(removed_units) <= 3:
                 title_parts.append(f"❌ GONE: {', '.join(removed_units)}")
             else:
@@ -487,22 +848,16 @@ class ApartmentMonitor:
         lines.append(f"<b>📊 ALL AVAILABLE UNITS ({len(current_units)} total)</b>:")
         lines.append("")
         
-        # Group by floor plan
-        by_plan = {}
-        for unit_num, info in current_units.items():
-            plan = info['floor_plan']
-            if plan not in by_plan:
-                by_plan[plan] = []
-            by_plan[plan].append(unit_num)
+        if groups is None:
+            groups = self._group_by_plan(current_units)
         
-        for plan in sorted(by_plan.keys()):
-            units_str = ', '.join(sorted(by_plan[plan]))
-            lines.append(f"Floor Plan {plan}: {units_str}")
+        for plan, units in groups.items():
+            lines.append(f"Floor Plan {plan}: {', '.join(units)}")
         
         lines.append("")
         lines.append(f"🕐 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
-        content = '<br>'.join(lines)
+        content = '<br/>'.join(lines)
         return title, content
     
     def cleanup(self):
@@ -512,24 +867,35 @@ class ApartmentMonitor:
                 self.driver.quit()
             except:
                 pass
+        
+        # Changes still waiting out --notify-window would otherwise be lost
+        self.flush_pending_notifications(force=True)
+        
+        if self._http_session is not None:
+            self._http_session.close()
+        if self._mailer is not None:
+            self._mailer.close()
+        
+        # Let the writer finish any pending snapshot before exiting
+        try:
+            self._write_q.put(None, timeout=5)
+            self._writer.join(timeout=5)
+        except queue.Full:
+            pass
     
     def run(self):
         """Main monitoring loop"""
         print(f"🚀 Starting Apartment Unit Monitor")
         print(f"📍 URL: {self.url}")
-        print(f"⏱️  Check interval: {self.check_interval} seconds")
+        print(f"⏱️  Check interval: {self.check_interval} seconds (up to {self._max_interval} when idle)")
         print(f"🕐 Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         
-        if not SELENIUM_AVAILABLE:
-            print("\n❌ Selenium is required but not installed")
-            print("Install with: pip install selenium")
-            sys.exit(1)
-        
-        print("\n🌐 Initializing browser...")
-        if not self.setup_driver():
-            sys.exit(1)
-        
-        print("✓ Browser ready")
+        if self.use_browser:
+            print("\n🌐 Initializing browser...")
+            if not self.setup_driver():
+                sys.exit(1)
+            
+            print("✓ Browser ready")
         
         # Load previous units from file if available
         loaded_units = self.load_from_file()
@@ -538,7 +904,8 @@ class ApartmentMonitor:
             print(f"✓ Loaded {len(loaded_units)} units from previous run")
         
         print(f"\nℹ️  Will check {len(self.floor_plans)} floor plans for available units")
-        print("   First check may take 2-3 minutes...")
+        if self.use_browser:
+            print("   First check may take 2-3 minutes...")
         print("   Results will be saved to: available_apartments.txt")
         print("\nPress Ctrl+C to stop monitoring...")
         print("="*80)
@@ -553,13 +920,27 @@ class ApartmentMonitor:
                 
                 # Fetch available units
                 current_units = self.fetch_available_units()
+                self._latest_units = current_units
+                
+                # Most checks see the exact same units; skip comparing, reporting and
+                # saving entirely then. This is the only change check in the loop.
+                units_hash = self._units_digest(current_units)
+                if units_hash == self._last_units_hash:
+                    print(f"✓ No changes ({len(current_units)} units available)")
+                    self.flush_pending_notifications(current_units)
+                    time.sleep(self._next_interval(changed=False))
+                    continue
+                self._last_units_hash = units_hash
                 
-                # Save to file
-                self.save_to_file(current_units)
+                # Group once per check and share it with every report below
+                self._current_groups = self._group_by_plan(current_units)
+                
+                # The unit set changed (or this is the first check), so save it
+                self.save_to_file(current_units, groups=self._current_groups)
                 
                 if iteration == 1 and not self.previous_units:
                     # First run with no previous data - display current state
-                    self.print_units(current_units)
+                    self.print_units(current_units, groups=self._current_groups)
                     self.previous_units = current_units
                     
                     # Send initial notification (filtered by floor plans)
@@ -569,78 +950,55 @@ class ApartmentMonitor:
                         if notify_units:
                             title = "🏠 Apartment Monitor Started"
                             if self.notify_floor_plans:
-                                plans_str = ', '.join(self.notify_floor_plans)
+                                plans_str = ', '.join(sorted(self.notify_floor_plans))
                                 lines = [f"✨ <b>Found {len(notify_units)} available units (Floor Plans: {plans_str})</b>:"]
                             else:
                                 lines = [f"✨ <b>Found {len(notify_units)} available units</b>:"]
                             
-                            by_plan = {}
-                            for unit_num, info in notify_units.items():
-                                plan = info['floor_plan']
-                                if plan not in by_plan:
-                                    by_plan[plan] = []
-                                by_plan[plan].append(unit_num)
-                            
-                            for plan in sorted(by_plan.keys()):
-                                units_str = ', '.join(sorted(by_plan[plan]))
-                                lines.append(f"  Floor Plan {plan}: {units_str}")
+                            notify_groups = self.filter_groups_by_floor_plan(self._current_groups)
+                            for plan, units in notify_groups.items():
+                                lines.append(f"  Floor Plan {plan}: {', '.join(units)}")
                             
                             lines.append("")
                             lines.append(f"🕐 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-                            content = '<br>'.join(lines)
+                            content = '<br/>'.join(lines)
                             
-                            notifications_sent = []
-                            if self.send_wechat_notification(title, content):
-                                notifications_sent.append("WeChat")
-                            if self.send_email_notification(title, content):
-                                notifications_sent.append("Email")
+                            notifications_sent = self.send_notifications(title, content)
                             
                             if notifications_sent:
                                 print(f"📱 Notifications sent: {', '.join(notifications_sent)} ({len(notify_units)} units)")
                             else:
                                 print("⚠️  No notifications configured or all failed")
                         else:
-                            print(f"ℹ️  No units match notification filter (Floor Plans: {', '.join(self.notify_floor_plans)})")
+                            print(f"ℹ️  No units match notification filter (Floor Plans: {', '.join(sorted(self.notify_floor_plans))})")
                 else:
                     # Compare with previous state (either from file or previous check)
                     changes = self.compare_units(current_units, self.previous_units)
                     
                     if any(changes.values()):
                         self.print_changes(changes)
-                        self.print_units(current_units)
+                        self.print_units(current_units, groups=self._current_groups)
                         
                         # Send change notification (filtered by floor plans)
-                        if self.wechat_token or self.email_to:
+                        if self.wechat_token or self.email_enabled:
                             filtered_changes = self.filter_changes_by_floor_plan(changes)
                             
                             if any(filtered_changes.values()):
-                                notify_units = self.filter_units_by_floor_plan(current_units)
-                                title, content = self.format_notification(filtered_changes, notify_units)
-                                
-                                notifications_sent = []
-                                if self.send_wechat_notification(title, content):
-                                    notifications_sent.append("WeChat")
-                                if self.send_email_notification(title, content):
-                                    notifications_sent.append("Email")
-                                
-                                if notifications_sent:
-                                    total_changed = len(filtered_changes['new']) + len(filtered_changes['removed'])
-                                    print(f"📱 Notifications sent: {', '.join(notifications_sent)} ({total_changed} changes)")
-                                else:
-                                    print("⚠️  No notifications configured or all failed")
+                                self.queue_changes(filtered_changes)
                             else:
                                 if self.notify_floor_plans:
-                                    print(f"ℹ️  Changes detected but none match notification filter ({', '.join(self.notify_floor_plans)})")
+                                    print(f"ℹ️  Changes detected but none match notification filter ({', '.join(sorted(self.notify_floor_plans))})")
                     else:
                         print(f"✓ No changes ({len(current_units)} units available)")
                     
+                    self.flush_pending_notifications(current_units)
                     self.previous_units = current_units
                 
                 # Wait for next check
                 if iteration == 1:
                     print(f"\n💤 Waiting {self.check_interval} seconds until next check...")
                 
-                time.sleep(self.check_interval)
+                time.sleep(self._next_interval(changed=True))
                 
         except KeyboardInterrupt:
             print("\n\n🛑 Monitoring stopped by user")
@@ -671,8 +1029,14 @@ Examples:
   # Custom check interval
   python apartment_monitor.py --interval 30
   
+  # Batch changes seen within 60 seconds into one notification
+  python apartment_monitor.py --notify-window 60
+  
+  # Render pages in Chrome instead of plain HTTP (fallback)
+  python apartment_monitor.py --use-browser
+  
   # Disable headless mode (show browser)
-  python apartment_monitor.py --no-headless
+  python apartment_monitor.py --use-browser --no-headless
         """
     )
     
@@ -693,79 +1057,79 @@ Examples:
     parser.add_argument(
         '--no-headless',
         action='store_true',
-        help='Show browser window (default: headless mode)'
+        help='Show browser window (default: headless mode, only with --use-browser)'
+    )
+    
+    parser.add_argument(
+        '--notify-window',
+        type=int,
+        default=0,
+        help='Seconds to batch changes into a single notification (default: 0, send immediately)'
+    )
+    
+    parser.add_argument(
+        '--use-browser',
+        action='store_true',
+        help='Render pages with Selenium/Chrome instead of plain HTTP requests'
     )
     
     args = parser.parse_args()
     
     url = "https://hanoverwinchester.com/floorplans/"
     
-    # Read WeChat token from secrets folder or environment variable
+    # Startup status lines, written in one go once configuration is settled
+    status = []
+    
+    # Read WeChat token from secrets folder or environment variable. Missing files
+    # are the common case, so just try the read instead of checking first
     wechat_token = None
-    token_file = os.path.join(os.path.dirname(__file__), 'secrets', 'wechat_token.txt')
+    secrets_dir = Path(__file__).parent / 'secrets'
+    token_file = secrets_dir / 'wechat_token.txt'
     
-    if os.path.exists(token_file):
-        try:
-            with open(token_file, 'r') as f:
-                wechat_token = f.read().strip()
-            print(f"✅ WeChat token loaded from: {token_file}")
-        except Exception as e:
-            print(f"⚠️  Failed to read token from {token_file}: {e}")
+    try:
+        wechat_token = token_file.read_text().strip()
+        status.append(f"✅ WeChat token loaded from: {token_file}")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        status.append(f"⚠️  Failed to read token from {token_file}: {e}")
     
     # Fall back to environment variable
     if not wechat_token:
         wechat_token = os.environ.get('WECHAT_TOKEN')
         if wechat_token:
-            print("✅ WeChat token loaded from environment variable")
+            status.append("✅ WeChat token loaded from environment variable")
     
     # Read email configuration from environment variables
-    email_to = os.environ.get('EMAIL_TO')
+    env = os.environ
+    email_to, email_from, smtp_server, smtp_port, smtp_password = (
+        env.get(key) for key in ('EMAIL_TO', 'EMAIL_FROM', 'SMTP_SERVER', 'SMTP_PORT', 'SMTP_PASSWORD')
+    )
+    smtp_port = int(smtp_port or 587)
+    smtp_servers = None
     # Support comma-separated list in env var
     if email_to and ',' in email_to:
         email_to = [e.strip() for e in email_to.split(',')]
     
-    email_from = os.environ.get('EMAIL_FROM')
-    smtp_server = os.environ.get('SMTP_SERVER')
-    smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-    smtp_password = os.environ.get('SMTP_PASSWORD')
-    
     # Or read from secrets/email_config.json
-    email_config_file = os.path.join(os.path.dirname(__file__), 'secrets', 'email_config.json')
-    if os.path.exists(email_config_file):
-        try:
-            with open(email_config_file, 'r') as f:
-                email_config = json.load(f)
-                email_to = email_to or email_config.get('email_to')
-                email_from = email_from or email_config.get('email_from')
-                smtp_server = smtp_server or email_config.get('smtp_server')
-                smtp_port = smtp_port if smtp_port != 587 else email_config.get('smtp_port', 587)
-                smtp_password = smtp_password or email_config.get('smtp_password')
-            print(f"✅ Email config loaded from: {email_config_file}")
-        except Exception as e:
-            print(f"⚠️  Failed to read email config from {email_config_file}: {e}")
+    email_config_file = str(secrets_dir / 'email_config.json')
+    try:
+        email_config = _load_email_config(email_config_file)
+        email_to = email_to or email_config.get('email_to')
+        email_from = email_from or email_config.get('email_from')
+        smtp_server = smtp_server or email_config.get('smtp_server')
+        smtp_port = smtp_port if smtp_port != 587 else email_config.get('smtp_port', 587)
+        smtp_password = smtp_password or email_config.get('smtp_password')
+        smtp_servers = email_config.get('smtp_servers')
+        status.append(f"✅ Email config loaded from: {email_config_file}")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        status.append(f"⚠️  Failed to read email config from {email_config_file}: {e}")
     
     # Only notify for 2+ bedroom floor plans (N, O, P, Q, R, S, T, U, V)
     notify_floor_plans = ['N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V']
     
-    # Print configuration status
-    notifications_enabled = []
-    if wechat_token:
-        notifications_enabled.append(f"WeChat ({args.wechat_method})")
-    if email_to and email_from and smtp_server and smtp_password:
-        if isinstance(email_to, list):
-            recipients_str = ', '.join(email_to)
-            notifications_enabled.append(f"Email ({len(email_to)} recipients: {recipients_str})")
-        else:
-            notifications_enabled.append(f"Email (to: {email_to})")
-    
-    if notifications_enabled:
-        print(f"✅ Notifications enabled: {', '.join(notifications_enabled)}")
-        print(f"ℹ️  Notification filter: Floor Plans {', '.join(notify_floor_plans)} only")
-    else:
-        print("ℹ️  No notifications configured")
-        print("   - WeChat: add token to secrets/wechat_token.txt")
-        print("   - Email: create secrets/email_config.json with email settings")
-    
     monitor = ApartmentMonitor(
         url, 
         args.interval, 
@@ -777,8 +1141,33 @@ Examples:
         email_from=email_from,
         smtp_server=smtp_server,
         smtp_port=smtp_port,
-        smtp_password=smtp_password
+        smtp_password=smtp_password,
+        smtp_servers=smtp_servers,
+        use_browser=args.use_browser,
+        notify_window=args.notify_window
     )
+    
+    # Print configuration status
+    notifications_enabled = []
+    if wechat_token:
+        notifications_enabled.append(f"WeChat ({args.wechat_method})")
+    if monitor.email_enabled:
+        recipients = monitor.email_recipients
+        if len(recipients) > 1:
+            notifications_enabled.append(f"Email ({len(recipients)} recipients: {', '.join(recipients)})")
+        else:
+            notifications_enabled.append(f"Email (to: {recipients[0]})")
+    
+    if notifications_enabled:
+        status.append(f"✅ Notifications enabled: {', '.join(notifications_enabled)}")
+        status.append(f"ℹ️  Notification filter: Floor Plans {', '.join(notify_floor_plans)} only")
+    else:
+        status.append("ℹ️  No notifications configured")
+        status.append("   - WeChat: add token to secrets/wechat_token.txt")
+        status.append("   - Email: create secrets/email_config.json with email settings")
+    
+    sys.stdout.write('\n'.join(status) + '\n')
+    
     monitor.run()
 
 
@@ -0,0 +1,466 @@
+"""
+SMTP helpers for the apartment monitor
+Connection classes used by the email notification path
+"""
+
+import atexit
+import base64
+import collections
+import itertools
+import queue
+import re
+import smtplib
+import socket
+import ssl
+import threading
+import time
+from typing import List, Optional
+
+# Seconds to wait on connect and on each reply; the stdlib default is to block forever
+SMTP_TIMEOUT = 30
+
+# One TLS context for every STARTTLS, so the CA bundle is loaded once per process
+_SSL_CTX = ssl.create_default_context()
+
+# Message bodies are dot-stuffed and must use CRLF line endings on the wire
+_LEADING_DOT_RE = re.compile(br'(?m)^\.')
+_EOL_RE = re.compile(r'(?:\r\n|\n|\r(?!\n))')
+
+# Fixed headers of every notification email: single-part HTML with a base64 body
+_HTML_HEAD = (
+    b'Content-Type: text/html; charset="utf-8"\r\n'
+    b'MIME-Version: 1.0\r\n'
+    b'Content-Transfer-Encoding: base64\r\n'
+    b'\r\n'
+)
+# Recipients go one per folded line so long lists stay under the header line limit
+_TO_SEP = ',\r\n '
+
+# Resolved SMTP server addresses, reused across reconnects for this many seconds
+_DNS_TTL = 300
+_DNS_CACHE = {}
+_DNS_LOCK = threading.Lock()
+
+# A worker stops and backs off once at least _ABORT_MIN_ATTEMPTS sends were made in
+# the last _ABORT_WINDOW seconds and more than a third of them failed. This only comes
+# into play for large backlogs; a handful of notifications never reaches it.
+_ABORT_MIN_ATTEMPTS = 30
+_ABORT_WINDOW = 600
+_MAX_BACKOFF = 300
+
+
+def _resolve(host: str, port: int) -> list:
+    """Return the (address, port) pairs for a server, from the cache while it is fresh"""
+    key = (host, port)
+    now = time.monotonic()
+    with _DNS_LOCK:
+        cached = _DNS_CACHE.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    addrs = [info[4][:2] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    with _DNS_LOCK:
+        _DNS_CACHE[key] = (now + _DNS_TTL, addrs)
+    return addrs
+
+
+def _forget(host: str, port: int):
+    """Drop a cached lookup so the next connect resolves the host again"""
+    with _DNS_LOCK:
+        _DNS_CACHE.pop((host, port), None)
+
+
+class PipelinedSMTP(smtplib.SMTP):
+    """
+    SMTP client that pipelines the mail transaction (RFC 2920)
+
+    When the server advertises PIPELINING, MAIL FROM, every RCPT TO and DATA
+    are written in one go and their replies are read back in order, so a
+    message costs one round trip for the envelope instead of one per command.
+    Otherwise it behaves exactly like smtplib.SMTP.
+
+    Replies are read with the inherited getreply(): it reads from a buffered
+    socket file whose readline() is implemented in C, so replies that arrive
+    together are already split out of one chunked read.
+
+    The server's address is looked up once and reused by later connections;
+    smtplib still uses the hostname for the TLS handshake.
+    """
+
+    def _get_socket(self, host, port, timeout):
+        error = None
+        for addr in _resolve(host, port):
+            try:
+                return socket.create_connection(addr, timeout, self.source_address)
+            except OSError as e:
+                error = e
+
+        # The cached addresses may be stale; look the host up again next time
+        _forget(host, port)
+        raise error
+
+    def sendmail(self, from_addr, to_addrs, msg, mail_options=(), rcpt_options=()):
+        self.ehlo_or_helo_if_needed()
+        if not self.has_extn('pipelining') or mail_options or rcpt_options:
+            return super().sendmail(from_addr, to_addrs, msg, mail_options, rcpt_options)
+
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+        if isinstance(msg, str):
+            msg = _EOL_RE.sub('\r\n', msg).encode('ascii')
+
+        # Send the whole envelope at once, then collect the replies in order
+        commands = [f"MAIL FROM:{smtplib.quoteaddr(from_addr)}"]
+        commands.extend(f"RCPT TO:{smtplib.quoteaddr(addr)}" for addr in to_addrs)
+        commands.append("DATA")
+        self.send(''.join(f"{command}\r\n" for command in commands))
+
+        mail_code, mail_resp = self.getreply()
+        if mail_code == 421:
+            self.close()
+            raise smtplib.SMTPSenderRefused(mail_code, mail_resp, from_addr)
+
+        refused = {}
+        for addr in to_addrs:
+            code, resp = self.getreply()
+            if code not in (250, 251):
+                refused[addr] = (code, resp)
+
+        data_code, data_resp = self.getreply()
+
+        if mail_code != 250 or len(refused) == len(to_addrs) or data_code != 354:
+            if data_code == 354:
+                # The server is waiting for a body we no longer want to send
+                self.send(b'.\r\n')
+                self.getreply()
+            self._reset()
+
+            if mail_code != 250:
+                raise smtplib.SMTPSenderRefused(mail_code, mail_resp, from_addr)
+            if len(refused) == len(to_addrs):
+                raise smtplib.SMTPRecipientsRefused(refused)
+            raise smtplib.SMTPDataError(data_code, data_resp)
+
+        body = _LEADING_DOT_RE.sub(b'..', msg)
+        if body[-2:] != b'\r\n':
+            body += b'\r\n'
+        self.send(body + b'.\r\n')
+
+        code, resp = self.getreply()
+        if code != 250:
+            if code == 421:
+                self.close()
+            else:
+                self._reset()
+            raise smtplib.SMTPDataError(code, resp)
+
+        return refused
+
+    def _reset(self):
+        """RSET the transaction, ignoring a server that has already hung up"""
+        try:
+            self.rset()
+        except smtplib.SMTPServerDisconnected:
+            pass
+
+
+def build_message(sender: str, subject: str, html: str, to_addrs: List[str]) -> bytes:
+    """
+    Serialize an HTML email ready to hand to sendmail
+
+    Args:
+        sender: From address
+        subject: Email subject
+        html: Full HTML body
+        to_addrs: Recipients, listed together in the To header
+
+    Returns:
+        The message as bytes with CRLF line endings
+    """
+    # Only the addressing headers and the body differ between messages; the rest
+    # is the prebuilt _HTML_HEAD, so the email package's generator never runs
+    head = (
+        f"Subject: {_encode_header(subject)}\r\n"
+        f"From: {sender}\r\n"
+        f"To: {_TO_SEP.join(to_addrs)}\r\n"
+    ).encode('utf-8')
+
+    # sendmail sends bytes as-is, so the base64 lines need CRLF endings too
+    body = base64.encodebytes(html.encode('utf-8')).replace(b'\n', b'\r\n')
+    return head + _HTML_HEAD + body
+
+
+def _encode_header(value: str) -> str:
+    """Return a header value as-is when it is short plain ASCII, otherwise RFC 2047 encoded"""
+    if value.isascii() and len(value) < 900 and not _EOL_RE.search(value):
+        return value
+
+    from email.header import Header
+    return Header(value, 'utf-8').encode(linesep='\r\n')
+
+
+class SMTPEndpoint:
+    """One SMTP provider: connection settings plus its send rate and concurrency"""
+
+    def __init__(self, host: str, port: int = 587, user: Optional[str] = None,
+                 password: Optional[str] = None, rate: Optional[float] = None,
+                 workers: int = 1, batch_size: int = 10, timeout: float = SMTP_TIMEOUT,
+                 max_messages: int = 10000):
+        """
+        Args:
+            host: SMTP server address
+            port: SMTP server port
+            user: Login name (defaults to the sender address)
+            password: SMTP password
+            rate: Maximum messages per second, or None for no limit
+            workers: Number of parallel connections to this server
+            batch_size: Messages that may wait for this server before it counts as busy
+            timeout: Seconds before a connect or a reply from the server times out
+            max_messages: Messages to send over one connection before reconnecting
+        """
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.rate = rate
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        self.max_messages = max(1, max_messages)
+
+        # Token bucket for the rate limit, shared by all of this endpoint's workers
+        self._capacity = max(1.0, rate or 0)
+        self._tokens = self._capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'SMTPEndpoint':
+        """Build an endpoint from an entry of email_config.json's smtp_servers list"""
+        return cls(
+            host=config['host'],
+            port=int(config.get('port', 587)),
+            user=config.get('user'),
+            password=config.get('password'),
+            rate=float(config['rate']) if config.get('rate') else None,
+            workers=int(config.get('workers', 1)),
+            batch_size=int(config.get('batch_size', 10)),
+            timeout=float(config.get('timeout', SMTP_TIMEOUT)),
+            max_messages=int(config.get('max_messages', 10000)),
+        )
+
+    def acquire(self):
+        """Block until the rate limit allows another message"""
+        if not self.rate:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+
+            # Take the token now, even if that means waiting for it below
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+
+class SMTPConnection:
+    """A logged-in connection to one endpoint, reconnecting when it drops"""
+
+    def __init__(self, endpoint: SMTPEndpoint, sender: str):
+        self.endpoint = endpoint
+        self.sender = sender
+        self._smtp = None
+        self._sent = 0
+
+    def _get_smtp(self) -> smtplib.SMTP:
+        """Return the cached connection if it still answers NOOP, otherwise reconnect"""
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.close()
+
+        endpoint = self.endpoint
+        server = PipelinedSMTP(endpoint.host, endpoint.port, timeout=endpoint.timeout)
+        try:
+            server.starttls(context=_SSL_CTX)
+            server.login(endpoint.user or self.sender, endpoint.password)
+        except Exception:
+            server.close()
+            raise
+
+        self._smtp = server
+        self._sent = 0
+        return server
+
+    def send(self, to_addrs: List[str], msg: bytes):
+        """Send one message, reconnecting and retrying once if the server hung up"""
+        try:
+            self._get_smtp().sendmail(self.sender, to_addrs, msg)
+        except smtplib.SMTPServerDisconnected:
+            # Dropped between the health check and the send
+            self.close()
+            self._get_smtp().sendmail(self.sender, to_addrs, msg)
+        except Exception:
+            # Don't reuse a connection that may be in a bad state
+            self.close()
+            raise
+
+        # Recycle long-lived connections so per-session state on the server stays bounded
+        self._sent += 1
+        if self._sent >= self.endpoint.max_messages:
+            self.close()
+
+    def close(self):
+        """Close the connection, if any"""
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+
+class MailDispatcher:
+    """
+    Deliver messages through one or more SMTP endpoints in the background
+
+    Every endpoint gets its own queue and worker threads, each worker holding
+    a persistent connection. Messages are handed out round-robin, skipping
+    endpoints whose queue is full, so a slow or heavily rate-limited provider
+    doesn't hold up the others.
+    """
+
+    def __init__(self, endpoints: List[SMTPEndpoint], sender: str):
+        self.sender = sender
+        self._queues = []
+        self._threads = []
+
+        for endpoint in endpoints:
+            endpoint_q = queue.Queue(maxsize=endpoint.batch_size)
+            self._queues.append(endpoint_q)
+            for _ in range(endpoint.workers):
+                thread = threading.Thread(target=self._worker, args=(endpoint, endpoint_q), daemon=True)
+                thread.start()
+                self._threads.append((thread, endpoint_q))
+
+        self._round_robin = itertools.cycle(self._queues)
+        # Set when close() starts, and when it gives up waiting on the workers
+        self._closing = threading.Event()
+        self._abandoned = threading.Event()
+
+        # Deliver what's queued and say QUIT on exit even if close() is never called
+        atexit.register(self.close)
+
+    def submit(self, subject: str, html: str, to_addrs: List[str]) -> bool:
+        """
+        Queue a message for delivery on the next endpoint that has room
+
+        Returns:
+            True if the message was queued, False if every endpoint was backed up
+        """
+        item = (subject, html, list(to_addrs))
+        for _ in range(len(self._queues)):
+            try:
+                next(self._round_robin).put_nowait(item)
+                return True
+            except queue.Full:
+                continue
+
+        # Never block the caller (the check loop) behind a stuck server
+        print(f"⚠️  Email queue full, dropping: {subject}")
+        return False
+
+    def _worker(self, endpoint: SMTPEndpoint, endpoint_q: queue.Queue):
+        """Build and send queued messages over one persistent connection until told to stop"""
+        connection = SMTPConnection(endpoint, self.sender)
+        retry = collections.deque()
+        # (time, succeeded) for each send in the last _ABORT_WINDOW seconds
+        results = collections.deque()
+        failed = 0
+        # Consecutive backoffs without a successful send in between
+        aborts = 0
+        try:
+            while True:
+                item = retry.popleft() if retry else endpoint_q.get()
+                if item is None or self._abandoned.is_set():
+                    return
+
+                ok = False
+                try:
+                    # MIME encoding happens here rather than on the caller's thread
+                    subject, html, to_addrs = item
+                    msg = build_message(self.sender, subject, html, to_addrs)
+                    endpoint.acquire()
+                    connection.send(to_addrs, msg)
+                    ok = True
+                    aborts = 0
+                except Exception as e:
+                    print(f"⚠️  Failed to send email via {endpoint.host}: {e}")
+
+                now = time.monotonic()
+                results.append((now, ok))
+                failed += not ok
+                while results[0][0] < now - _ABORT_WINDOW:
+                    failed -= not results.popleft()[1]
+
+                if len(results) >= _ABORT_MIN_ATTEMPTS and failed * 3 > len(results):
+                    # The provider is erroring or throttling us; stop hammering it
+                    retry.extend(self._drain(endpoint_q))
+                    wait = min(_MAX_BACKOFF, 2 ** aborts)
+                    print(f"⚠️  {failed}/{len(results)} emails via {endpoint.host} failed, "
+                          f"retrying {len(retry)} queued in {wait}s")
+                    # close() cuts the backoff short so shutdown isn't stuck behind it
+                    self._closing.wait(wait)
+                    results.clear()
+                    failed = 0
+                    aborts += 1
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _drain(endpoint_q: queue.Queue) -> list:
+        """Take every message currently waiting in a queue without blocking"""
+        items = []
+        stops = 0
+        while True:
+            try:
+                item = endpoint_q.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stops += 1
+            else:
+                items.append(item)
+
+        # Leave shutdown sentinels for the other workers on this endpoint
+        for _ in range(stops):
+            endpoint_q.put_nowait(None)
+        return items
+
+    def close(self, timeout: float = 10):
+        """Finish sending queued messages within timeout seconds, then close every connection"""
+        if self._closing.is_set():
+            return
+        self._closing.set()
+        deadline = time.monotonic() + timeout
+
+        # One sentinel per worker, queued behind any messages still waiting
+        for _, endpoint_q in self._threads:
+            try:
+                endpoint_q.put(None, timeout=max(0, deadline - time.monotonic()))
+            except queue.Full:
+                break
+        for thread, _ in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+        if any(thread.is_alive() for thread, _ in self._threads):
+            # Workers stop at their next message instead of draining the rest
+            self._abandoned.set()
+            print(f"⚠️  Email delivery did not finish within {timeout}s, dropping unsent messages")
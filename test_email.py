@@ -4,10 +4,55 @@ Test script to send email from Gmail
 """
 
 import smtplib
+import ssl
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from datetime import datetime
+from string import Template
 import sys
 
+# Created once and used for every STARTTLS in this script
+_SSL_CTX = ssl.create_default_context()
+
+# Static test email body; only the send time varies
+_TEST_HTML_TEMPLATE = Template("""
+<html>
+  <head></head>
+  <body style="font-family: Arial, sans-serif; padding: 20px;">
+    <h2 style="color: #2c3e50;">🧪 Email Test Successful!</h2>
+    <div style="margin-top: 20px;">
+      <p><b>This is a test email from your Apartment Monitor script.</b></p>
+      <br/>
+      <p>If you're seeing this, your Gmail SMTP configuration is working correctly! ✅</p>
+      <br/>
+      <p>Your apartment monitor is now ready to send you email notifications when:</p>
+      <ul>
+        <li>✨ New apartments become available</li>
+        <li>❌ Apartments are removed/rented</li>
+      </ul>
+      <br/>
+      <p style="color: #7f8c8d; font-size: 12px;">
+        Sent at: $ts
+      </p>
+    </div>
+  </body>
+</html>
+""")
+
+# Example secrets/email_config.json printed after a successful test
+_EMAIL_CONFIG_EXAMPLE = Template("""
+{
+  "email_to": [
+    "recipient1@example.com",
+    "recipient2@example.com"
+  ],
+  "email_from": "$email_from",
+  "smtp_server": "smtp.gmail.com",
+  "smtp_port": 587,
+  "smtp_password": "YOUR_APP_PASSWORD_HERE"
+}
+""")
+
 def send_test_email(gmail_address, gmail_app_password, recipients=None):
     """Send a test email from Gmail to specified recipients"""
     
@@ -30,53 +75,36 @@ def send_test_email(gmail_address, gmail_app_password, recipients=None):
     print("="*60)
     
     try:
-        # Create message
         # Create HTML content
-        html_content = """
-        <html>
-          <head></head>
-          <body style="font-family: Arial, sans-serif; padding: 20px;">
-            <h2 style="color: #2c3e50;">🧪 Email Test Successful!</h2>
-            <div style="margin-top: 20px;">
-              <p><b>This is a test email from your Apartment Monitor script.</b></p>
-              <br/>
-              <p>If you're seeing this, your Gmail SMTP configuration is working correctly! ✅</p>
-              <br/>
-              <p>Your apartment monitor is now ready to send you email notifications when:</p>
-              <ul>
-                <li>✨ New apartments become available</li>
-                <li>❌ Apartments are removed/rented</li>
-              </ul>
-              <br/>
-              <p style="color: #7f8c8d; font-size: 12px;">
-                Sent at: 2025-10-07 14:30:00
-              </p>
-            </div>
-          </body>
-        </html>
-        """
+        html_content = _TEST_HTML_TEMPLATE.substitute(ts=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
         
-        # Connect and send to all recipients
+        # Connect and send to all recipients; time out instead of hanging on an unreachable host
         print("\n📤 Connecting to Gmail SMTP server...")
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
+        with smtplib.SMTP(smtp_server, smtp_port, timeout=30) as server:
             print("🔐 Starting TLS encryption...")
-            server.starttls()
+            server.starttls(context=_SSL_CTX)
             
             print("🔑 Logging in...")
             server.login(email_from, gmail_app_password)
             
             print(f"📨 Sending email to {len(recipients)} recipient(s)...")
+            # Same body for everyone: build and serialize once, send in one transaction
+            msg = MIMEMultipart('alternative')
+            msg['Subject'] = "🧪 Test Email - Apartment Monitor"
+            msg['From'] = email_from
+            msg['To'] = ', '.join(recipients)
+            
+            html_part = MIMEText(html_content, 'html')
+            msg.attach(html_part)
+            
+            # sendmail sends bytes as-is, so serialize with SMTP's CRLF line endings
+            raw = msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+            refused = server.sendmail(email_from, recipients, raw)
             for recipient in recipients:
-                msg = MIMEMultipart('alternative')
-                msg['Subject'] = "🧪 Test Email - Apartment Monitor"
-                msg['From'] = email_from
-                msg['To'] = recipient
-                
-                html_part = MIMEText(html_content, 'html')
-                msg.attach(html_part)
-                
-                server.send_message(msg)
-                print(f"   ✓ Sent to {recipient}")
+                if recipient in refused:
+                    print(f"   ✗ Refused by server: {recipient}")
+                else:
+                    print(f"   ✓ Sent to {recipient}")
         
         print("\n" + "="*60)
         print("✅ SUCCESS! Email(s) sent successfully!")
@@ -152,18 +180,7 @@ def main():
         print("\nTo use with the apartment monitor:")
         print("1. Create: secrets/email_config.json")
         print("2. Add this content:")
-        print(f'''
-{{
-  "email_to": [
-    "recipient1@example.com",
-    "recipient2@example.com"
-  ],
-  "email_from": "{gmail_address}",
-  "smtp_server": "smtp.gmail.com",
-  "smtp_port": 587,
-  "smtp_password": "YOUR_APP_PASSWORD_HERE"
-}}
-''')
+        print(_EMAIL_CONFIG_EXAMPLE.substitute(email_from=gmail_address))
         print("3. Run: python apartment_monitor.py")
         print("\nNote: email_to can be a single string or list of multiple recipients")
     else: